@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+import numpy as np
 import sqlite3
 import datetime
 import json
-import time
+import math
+import copy
+import importlib.util
+import os
+import re
+import threading
+import collections
 
 # --- SAFETY CHECK: Imports ---
 try:
@@ -17,11 +22,15 @@ except ImportError as e:
     st.stop()
 
 # --- PDF LIBRARY CHECK ---
+# Only locate the package here; fpdf itself is imported on the first report
+pdf_available = importlib.util.find_spec('fpdf') is not None
+
+# --- JIT LIBRARY CHECK ---
 try:
-    from fpdf import FPDF
-    pdf_available = True
+    from numba import njit
+    numba_available = True
 except ImportError:
-    pdf_available = False
+    numba_available = False
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -32,143 +41,151 @@ st.set_page_config(
 )
 
 # --- ANALYTICS THEME CSS ---
-st.markdown("""
-    <style>
-        /* 1. BACKGROUND: Professional Dark Analytics Theme */
-        .stApp {
-            background: linear-gradient(135deg, #0b0f19 0%, #16222a 100%);
-            color: #ffffff;
-        }
-
-        /* 2. TYPOGRAPHY */
-        h1, h2, h3 {
-            color: #00FF99 !important; /* Neon Green Title */
-            font-family: 'Helvetica Neue', sans-serif;
-            font-weight: 700;
-        }
-        p, label, .stMarkdown {
-            color: #E0E0E0 !important;
-            font-size: 1.05rem;
-        }
-
-        /* 3. INPUT FIELDS */
-        .stTextInput input, .stNumberInput input, .stSelectbox div[data-baseweb="select"] {
-            background-color: #1F2937;
-            color: #00FF99 !important;
-            border: 1px solid #374151;
-            border-radius: 8px;
-        }
-
-        /* 4. BUTTONS */
-        div.stButton > button {
-            background: linear-gradient(90deg, #00C853, #64DD17);
-            color: #000000;
-            font-weight: bold;
-            border: none;
-            padding: 0.5rem 1rem;
-            border-radius: 6px;
-            box-shadow: 0 4px 14px rgba(0, 200, 83, 0.4);
-            transition: all 0.3s ease;
-        }
-        div.stButton > button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 20px rgba(0, 200, 83, 0.6);
-            color: white;
-        }
-
-        /* 5. METRIC CARDS */
-        div[data-testid="metric-container"] {
-            background-color: rgba(255, 255, 255, 0.05);
-            border: 1px solid #00FF99;
-            border-left: 6px solid #00FF99;
-            padding: 20px;
-            border-radius: 12px;
-            box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        }
-        [data-testid="stMetricValue"] {
-            font-size: 2.5rem !important;
-            color: #ffffff !important;
-        }
-        [data-testid="stMetricLabel"] {
-            color: #00FF99 !important;
-            font-size: 1rem;
-            font-weight: bold;
-        }
-
-        /* 6. SIDEBAR */
-        section[data-testid="stSidebar"] {
-            background-color: #0f172a;
-            border-right: 1px solid #334155;
-        }
-
-        /* 7. TABS */
-        .stTabs [aria-selected="true"] {
-            background-color: rgba(0, 255, 153, 0.2) !important;
-            border-bottom: 2px solid #00FF99 !important;
-            color: #00FF99 !important;
-        }
-        
-        /* 8. ALERTS */
-        .stAlert {
-            background-color: rgba(255,255,255,0.05);
-            border: 1px solid #444;
-            color: white;
-        }
-    </style>
-""", unsafe_allow_html=True)
+CSS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styles.css')
+
+# Read and minify the stylesheet once per process; only the compact string
+# goes over the websocket on each rerun
+@st.cache_resource
+def _css():
+    with open(CSS_FILE, encoding='utf-8') as f:
+        css = f.read()
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+# st.html routes a style-only payload to the page's event container: no markdown parse, no layout slot
+st.html(f"<style>{_css()}</style>")
 
 # --- DATABASE SETUP ---
 DB_FILE = 'green_analytics.db'
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, name TEXT, password_hash TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, username TEXT, timestamp TEXT, overall REAL, e_score REAL, s_score REAL, g_score REAL, details TEXT)''')
-    conn.commit()
-    conn.close()
-
-def register_user(username, name, password):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    try:
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        c.execute("INSERT INTO users (username, name, password_hash) VALUES (?, ?, ?)", (username, name, hashed))
+# Fixed statement text: sqlite3 keeps compiled statements per connection keyed on the SQL
+# string, so reusing these constants on the shared connection skips re-parsing
+SQL_INSERT_USER = "INSERT INTO users (username, name, password_hash) VALUES (?, ?, ?)"
+SQL_SELECT_USERS = "SELECT username, name, password_hash FROM users"
+# Both timestamps come from SQLite's own clock: local ISO text (as isoformat() wrote it) and UTC epoch
+# The nine inputs are stored as REAL columns (in SCORE_KEYS order) so history can be aggregated in SQL
+SQL_INSERT_HISTORY = ("INSERT INTO history (username, timestamp, ts_epoch, overall, e_score, s_score, g_score, "
+                      "energy, water, recycling, renewable, turnover, incidents, diversity, board, ethics) "
+                      "VALUES (?, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'), CAST(strftime('%s', 'now') AS INTEGER), "
+                      "?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+SQL_SELECT_HISTORY = ("SELECT ts_epoch AS Date, overall AS Overall, e_score AS Environmental, s_score AS Social, g_score AS Governance "
+                      "FROM history WHERE username = ? ORDER BY id ASC")
+
+# One connection per process, shared by every rerun and session.
+# Creating it also bootstraps the schema, so that work runs once per process too.
+@st.cache_resource
+def get_conn():
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Serve reads from mapped pages (256 MB window) and keep ~64 MB of page cache
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-64000")
+    init_db(conn)
+    return conn
+
+# Sessions run in separate threads and share one connection. Reads take the lock too: a
+# transaction is per connection, so a reader on another thread would otherwise see (and
+# cache) a writer's uncommitted rows
+@st.cache_resource
+def get_db_lock():
+    return threading.Lock()
+
+def _finite_or_none(v):
+    return float(v) if isinstance(v, (int, float)) and math.isfinite(v) else None
+
+def init_db(conn):
+    with get_db_lock():
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, name TEXT, password_hash TEXT)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, username TEXT, timestamp TEXT, overall REAL, e_score REAL, s_score REAL, g_score REAL, details TEXT, ts_epoch INTEGER, '''
+                  '''energy REAL, water REAL, recycling REAL, renewable REAL, turnover REAL, incidents REAL, diversity REAL, board REAL, ethics REAL)''')
+        # Migration: older databases only have the ISO text timestamp (stored in local time)
+        if 'ts_epoch' not in [col[1] for col in c.execute("PRAGMA table_info(history)")]:
+            c.execute("ALTER TABLE history ADD COLUMN ts_epoch INTEGER")
+            c.execute("UPDATE history SET ts_epoch = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)")
+        # Migration: inputs used to be a JSON text blob in details; copy them into per-metric columns
+        existing = [col[1] for col in c.execute("PRAGMA table_info(history)")]
+        missing = [k for k in SCORE_KEYS if k not in existing]
+        for k in missing:
+            c.execute(f"ALTER TABLE history ADD COLUMN {k} REAL")
+        if missing:
+            # Parsed in Python: old saves could write NaN (e.g. a blank CSV cell), which SQLite's
+            # json_extract rejects as malformed. Non-finite or non-numeric values become NULL
+            backfill = []
+            for row_id, details in c.execute("SELECT id, details FROM history WHERE details IS NOT NULL").fetchall():
+                try:
+                    d = json.loads(details)
+                except ValueError:
+                    continue
+                if isinstance(d, dict):
+                    backfill.append((*(_finite_or_none(d.get(k)) for k in missing), row_id))
+            c.executemany("UPDATE history SET " + ", ".join(f"{k} = ?" for k in missing) + " WHERE id = ?", backfill)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_history_user ON history(username, id)")
         conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
 
+# bcrypt cost factor for new accounts; each step doubles hashing time (library default is 12)
+SALT_ROUNDS = 10
+
+def register_user(username, name, password):
+    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=SALT_ROUNDS)).decode('utf-8')
+    conn = get_conn()
+    with get_db_lock():
+        try:
+            with conn:
+                conn.execute(SQL_INSERT_USER, (username, name, hashed))
+        except sqlite3.IntegrityError:
+            return False
+    get_credentials.clear()
+    return True
+
+@st.cache_data(ttl=60, show_spinner=False)
 def get_credentials():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT username, name, password_hash FROM users")
-    users = c.fetchall()
-    conn.close()
+    conn = get_conn()
+    with get_db_lock():
+        users = conn.execute(SQL_SELECT_USERS).fetchall()
     creds = {"usernames": {}}
     for u, n, p in users:
         creds["usernames"][u] = {"name": n, "password": p}
     return creds
 
 def save_data(username, overall, e, s, g, details):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO history (username, timestamp, overall, e_score, s_score, g_score, details) VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (username, datetime.datetime.now().isoformat(), overall, e, s, g, json.dumps(details)))
-    conn.commit()
-    conn.close()
+    save_many(username, [(overall, e, s, g, tuple(details.get(k) for k in SCORE_KEYS))])
+
+def save_many(username, rows):
+    # rows: (overall, e, s, g, metrics) tuples with metrics in SCORE_KEYS order (None if not given),
+    # written with one executemany in a single transaction
+    params = [(username, overall, e, s, g, *metrics) for overall, e, s, g, metrics in rows]
+    conn = get_conn()
+    # The connection context commits on success and rolls back on error, so a
+    # failed insert never leaves the shared connection mid-transaction
+    with get_db_lock():
+        with conn:
+            # Take SQLite's write lock up front: with another process on the file, a deferred
+            # transaction could fail to upgrade mid-batch with SQLITE_BUSY
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(SQL_INSERT_HISTORY, params)
+        # Bump only after the commit so no reader can cache the new version without the rows
+        _history_versions()[username] += 1
+
+# Per-user write counters, bumped under the database lock. They are part of the history
+# cache key, so a save only invalidates that user's entry instead of everyone's
+@st.cache_resource
+def _history_versions():
+    return collections.Counter()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _load_history(username, version):
+    # id is monotonic, so the (username, id) index serves the sort
+    conn = get_conn()
+    with get_db_lock():
+        return pd.read_sql_query(SQL_SELECT_HISTORY, conn, params=(username,), parse_dates={'Date': {'unit': 's', 'utc': True}})
 
 def get_history(username):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT timestamp, overall, e_score, s_score, g_score FROM history WHERE username = ? ORDER BY timestamp ASC", (username,))
-    data = c.fetchall()
-    conn.close()
-    return pd.DataFrame(data, columns=['Date', 'Overall', 'Environmental', 'Social', 'Governance'])
-
-init_db()
+    return _load_history(username, _history_versions()[username])
 
 # --- INSIGHT ENGINE ---
 def generate_text_insight(score, category):
@@ -181,71 +198,322 @@ def generate_text_insight(score, category):
 
 # --- PDF GENERATOR ---
 if pdf_available:
-    class PDF(FPDF):
-        def header(self):
-            self.set_font('Arial', 'B', 15)
-            self.set_text_color(0, 150, 0)
-            self.cell(0, 10, 'GreenAnalytics Report', 0, 1, 'C')
-            self.ln(5)
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-    def create_pdf(name, overall, e, s, g, inputs):
-        pdf = PDF()
+    # Unicode TTF faces for user-supplied text; without them reports fall back to latin-1 core fonts
+    UNICODE_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+    UNICODE_FONT_BOLD = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+    unicode_font_available = os.path.exists(UNICODE_FONT) and os.path.exists(UNICODE_FONT_BOLD)
+
+    @st.cache_resource
+    def _pdf_class():
+        from fpdf import FPDF
+
+        class PDF(FPDF):
+            body_font = 'DejaVu' if unicode_font_available else 'helvetica'
+            def clean(self, text):
+                # Core fonts only cover latin-1; swap anything else for '?' instead of raising
+                if self.body_font == 'helvetica':
+                    return text.encode('latin-1', 'replace').decode('latin-1')
+                return text
+            def header(self):
+                self.set_font('helvetica', 'B', 15)
+                self.set_text_color(0, 150, 0)
+                self.cell(0, 10, 'GreenAnalytics Report', new_x='LMARGIN', new_y='NEXT', align='C')
+                self.ln(5)
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('helvetica', 'I', 8)
+                self.cell(0, 10, f'Page {self.page_no()}', align='C')
+
+        return PDF
+
+    def _new_pdf():
+        pdf = _pdf_class()()
+        if unicode_font_available:
+            pdf.add_font('DejaVu', '', UNICODE_FONT)
+            pdf.add_font('DejaVu', 'B', UNICODE_FONT_BOLD)
         pdf.add_page()
         pdf.set_text_color(0, 0, 0)
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Prepared For: {name}", ln=True)
-        pdf.cell(200, 10, txt=f"Date: {datetime.datetime.now().strftime('%Y-%m-%d')}", ln=True)
+        pdf.set_font(pdf.body_font, size=12)
+        return pdf
+
+    # First page with the static header already drawn; each report works on a copy.
+    # Only used with core fonts: fpdf2 copies share the parsed TTF, and output() subsets it in place
+    _pdf_template = st.cache_resource(_new_pdf)
+
+    # Reruns with the same report (the download button re-renders on every rerun) reuse the bytes.
+    # Scores arrive rounded to the printed precision and inputs as an items tuple so the key hashes.
+    @st.cache_data(max_entries=32, show_spinner=False)
+    def create_pdf(name, overall, e, s, g, input_items, report_date):
+        pdf = _new_pdf() if unicode_font_available else copy.deepcopy(_pdf_template())
+        pdf.cell(200, 10, text=pdf.clean(f"Prepared For: {name}"), new_x='LMARGIN', new_y='NEXT')
+        pdf.cell(200, 10, text=f"Date: {report_date}", new_x='LMARGIN', new_y='NEXT')
         pdf.ln(10)
         
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(200, 10, txt="1. Performance Overview", ln=True)
-        pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Overall Rating: {overall:.1f} / 100", ln=True)
-        pdf.cell(200, 10, txt=f"Environmental: {e:.1f}", ln=True)
-        pdf.cell(200, 10, txt=f"Social: {s:.1f}", ln=True)
-        pdf.cell(200, 10, txt=f"Governance: {g:.1f}", ln=True)
+        pdf.set_font(pdf.body_font, 'B', 14)
+        pdf.cell(200, 10, text="1. Performance Overview", new_x='LMARGIN', new_y='NEXT')
+        pdf.set_font(pdf.body_font, size=12)
+        pdf.cell(200, 10, text=f"Overall Rating: {overall:.1f} / 100", new_x='LMARGIN', new_y='NEXT')
+        pdf.cell(200, 10, text=f"Environmental: {e:.1f}", new_x='LMARGIN', new_y='NEXT')
+        pdf.cell(200, 10, text=f"Social: {s:.1f}", new_x='LMARGIN', new_y='NEXT')
+        pdf.cell(200, 10, text=f"Governance: {g:.1f}", new_x='LMARGIN', new_y='NEXT')
         pdf.ln(10)
         
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(200, 10, txt="2. Input Data", ln=True)
-        pdf.set_font("Arial", size=10)
-        for key, value in inputs.items():
-            pdf.cell(200, 7, txt=f"{key.capitalize()}: {value}", ln=True)
-        return pdf.output(dest='S').encode('latin-1')
+        pdf.set_font(pdf.body_font, 'B', 14)
+        pdf.cell(200, 10, text="2. Input Data", new_x='LMARGIN', new_y='NEXT')
+        pdf.set_font(pdf.body_font, size=10)
+        # All input lines in one multi_cell
+        pdf.multi_cell(200, 7, text=pdf.clean("\n".join(f"{key.capitalize()}: {value}" for key, value in input_items)))
+        return bytes(pdf.output())
 
 # --- CALCULATION ENGINE ---
+# Column order of the (N, 9) input matrix and the defaults for missing metrics
+SCORE_KEYS = ('energy', 'water', 'recycling', 'renewable', 'turnover', 'incidents', 'diversity', 'board', 'ethics')
+SCORE_DEFAULTS = np.array([50000, 2000, 40, 0, 15, 0, 30, 60, 95], dtype=np.float64)
+
+# CSV "metric" names (lower-cased) accepted for each input: the raw keys and the form labels
+METRIC_KEYS = {k: k for k in SCORE_KEYS}
+METRIC_KEYS.update({
+    'energy consumption (kwh)': 'energy',
+    'water usage (m³)': 'water',
+    'recycling rate (%)': 'recycling',
+    'renewable energy (%)': 'renewable',
+    'employee turnover (%)': 'turnover',
+    'safety incidents': 'incidents',
+    'management diversity (%)': 'diversity',
+    'board independence (%)': 'board',
+    'ethics training (%)': 'ethics',
+})
+
+# Each pillar is a weighted sum of the transformed metrics (see _transform)
+SCORE_WEIGHTS = np.array([
+    [1/4, 1/4, 1/4, 1.5/4, 0, 0, 0, 0, 0],   # Environmental
+    [0, 0, 0, 0, 1/3, 1/3, 1/3, 0, 0],       # Social
+    [0, 0, 0, 0, 0, 0, 0, 1/2, 1/2],         # Governance
+])
+
+def _transform(a):
+    # Normalize inputs to 0-100 scale; "lower is better" metrics are inverted
+    t = a.copy()
+    t[:, 0] = np.maximum(0, 100 - a[:, 0]/1000)
+    t[:, 1] = np.maximum(0, 100 - a[:, 1]/500)
+    t[:, 4] = np.maximum(0, 100 - a[:, 4]*2)
+    t[:, 5] = np.maximum(0, 100 - a[:, 5]*10)
+    return t
+
+def _score_numpy(a, out):
+    # One (N, 9) @ (9, 3) product scores every row
+    np.clip(_transform(a) @ SCORE_WEIGHTS.T, 0, 100, out=out[:, 1:])
+    out[:, 0] = out[:, 1:].mean(axis=1)
+
+def _score_loop(a, out):
+    for i in range(a.shape[0]):
+        e = (max(0., 100 - a[i, 0]/1000) + max(0., 100 - a[i, 1]/500) + a[i, 2] + a[i, 3]*1.5) / 4
+        s = (max(0., 100 - a[i, 4]*2) + max(0., 100 - a[i, 5]*10) + a[i, 6]) / 3
+        g = (a[i, 7] + a[i, 8]) / 2
+        e = min(100., max(0., e))
+        s = min(100., max(0., s))
+        g = min(100., max(0., g))
+        out[i, 0] = (e + s + g) / 3
+        out[i, 1] = e
+        out[i, 2] = s
+        out[i, 3] = g
+
+# The script body reruns on every interaction; compiling here (or loading numba's disk
+# cache) once per process keeps the dispatcher from being rebuilt on each rerun.
+# Serial on purpose: every Streamlit session runs in its own thread and the
+# default workqueue threading layer cannot take concurrent parallel launches
+@st.cache_resource
+def _jit_score_kernel():
+    kernel = njit(cache=True, fastmath=True)(_score_loop)
+    # Warm up so the first real request doesn't pay the compile cost
+    kernel(np.zeros((1, 9)), np.empty((1, 4)))
+    return kernel
+
+_score_kernel = _jit_score_kernel() if numba_available else _score_numpy
+
+def score_batch(values):
+    # values: (N, 9) array ordered as SCORE_KEYS -> (N, 4) array of final, E, S, G
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    out = np.empty((values.shape[0], 4))
+    _score_kernel(values, out)
+    return out
+
+def pack_inputs(inputs):
+    # Pack straight into the kernel's column order, with safe defaults for missing metrics
+    return np.fromiter((inputs.get(k, d) for k, d in zip(SCORE_KEYS, SCORE_DEFAULTS)), dtype=np.float64, count=len(SCORE_KEYS))
+
 def calculate_scores(inputs):
-    # Safe defaults
-    energy = float(inputs.get('energy', 50000))
-    water = float(inputs.get('water', 2000))
-    recycling = float(inputs.get('recycling', 40))
-    renewable = float(inputs.get('renewable', 0))
-    turnover = float(inputs.get('turnover', 15))
-    incidents = float(inputs.get('incidents', 0))
-    diversity = float(inputs.get('diversity', 30))
-    board = float(inputs.get('board', 60))
-    ethics = float(inputs.get('ethics', 95))
-
-    # Normalize inputs to 0-100 scale
-    e_raw = ((max(0, 100 - energy/1000)) + (max(0, 100 - water/500)) + (recycling) + (renewable * 1.5)) / 4
-    e_score = min(100, max(0, e_raw))
-
-    s_raw = ((max(0, 100 - turnover*2)) + (max(0, 100 - incidents*10)) + (diversity)) / 3
-    s_score = min(100, max(0, s_raw))
-
-    g_raw = (board + ethics) / 2
-    g_score = min(100, max(0, g_raw))
-
-    final = (e_score + s_score + g_score) / 3
+    values = pack_inputs(inputs).reshape(1, -1)
+    final, e_score, s_score, g_score = (float(x) for x in score_batch(values)[0])
     return final, e_score, s_score, g_score
 
+# Simulator slider grids
+SIM_ENERGY_STEP = 1000
+SIM_ENERGY = np.arange(0, 100001, SIM_ENERGY_STEP)
+SIM_RECYCLING = np.arange(0, 101)
+SIM_TURNOVER = np.arange(0, 51)
+
+@st.cache_data(max_entries=64)
+def simulator_tables(inputs):
+    # Score every slider position once per input set; slider moves then become table lookups.
+    # E only varies with energy/recycling and S only with turnover, so two small tables suffice.
+    base = pack_inputs(inputs)
+    e_grid = np.tile(base, (SIM_ENERGY.size * SIM_RECYCLING.size, 1))
+    e_grid[:, SCORE_KEYS.index('energy')] = np.repeat(SIM_ENERGY, SIM_RECYCLING.size)
+    e_grid[:, SCORE_KEYS.index('recycling')] = np.tile(SIM_RECYCLING, SIM_ENERGY.size)
+    e_table = score_batch(e_grid)[:, 1].reshape(SIM_ENERGY.size, SIM_RECYCLING.size)
+    s_grid = np.tile(base, (SIM_TURNOVER.size, 1))
+    s_grid[:, SCORE_KEYS.index('turnover')] = SIM_TURNOVER
+    s_table = score_batch(s_grid)[:, 2]
+    return e_table, s_table
+
+# --- CHART BUILDERS ---
+# Plotly is imported on first chart build, keeping it off the login screen's cold start;
+# later imports are sys.modules lookups
+def _go():
+    import plotly.graph_objects as go
+    return go
+
+def _px():
+    import plotly.express as px
+    return px
+
+# A chart a few hundred pixels wide can't show more points than this
+HISTORY_MAX_POINTS = 500
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keep first/last points and, per bucket, the point that
+    # spans the largest triangle with the previous pick and the next bucket's mean
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+# Transparent background and white text shared by every figure; set explicitly rather than via a
+# Plotly template because st.plotly_chart swaps in its own theme template.
+# Figures that take user interaction also set a fixed uirevision and are rendered under a stable
+# key, so a rerun diff-updates the existing chart instead of rebuilding it and resetting the view
+DARK_LAYOUT = dict(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font={'color': "white"})
+
+def build_gauge(value):
+    go = _go()
+    fig_gauge = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = value,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        gauge = {
+            'axis': {'range': [None, 100], 'tickwidth': 1, 'tickcolor': "white"},
+            'bar': {'color': "#00FF99"},
+            'bgcolor': "rgba(0,0,0,0)",
+            'borderwidth': 2,
+            'bordercolor': "gray",
+            'steps': [
+                {'range': [0, 50], 'color': '#FF5252'},
+                {'range': [50, 75], 'color': '#FFD740'},
+                {'range': [75, 100], 'color': '#69F0AE'}],
+            'threshold': {
+                'line': {'color': "white", 'width': 4},
+                'thickness': 0.75,
+                'value': 80}}))
+    fig_gauge.update_layout(DARK_LAYOUT, margin=dict(l=20,r=20,t=50,b=20))
+    return fig_gauge
+
+# Matrix columns behind the breakdown bars, in bar order
+BREAKDOWN_COLS = [0, 1, 2, 4, 5, 6, 7, 8]
+
+def build_breakdown(inputs):
+    # Horizontal Bar Chart
+    metrics = ['Energy Eff.', 'Water Mgmt', 'Recycling', 'Social Turnover', 'Safety', 'Diversity', 'Board', 'Ethics']
+    # Same per-metric transform as the scoring engine, capped with one clip; renewable has no bar
+    scores = np.clip(_transform(pack_inputs(inputs).reshape(1, -1))[0, BREAKDOWN_COLS], 0, 100).tolist()
+
+    go = _go()
+    fig_bar = go.Figure(go.Bar(x=scores, y=metrics, orientation='h', text=scores,
+                               marker=dict(color=scores, colorscale=['#FF5252', '#FFD740', '#00FF99'],
+                                           showscale=True, colorbar=dict(title='Score'))))
+    fig_bar.update_layout(DARK_LAYOUT, xaxis=dict(showgrid=False, title='Score'), yaxis=dict(showgrid=False, title='Metric'),
+                          uirevision='breakdown')
+    return fig_bar
+
+# Plotly Express is slow to build a figure from a DataFrame, so this one is memoized
+@st.cache_data(max_entries=64)
+def build_history_chart(hist_df):
+    px = _px()
+    # WebGL traces (scattergl) keep long histories off the SVG renderer
+    fig_line = px.line(hist_df, x='Date', y=['Overall', 'Environmental', 'Social', 'Governance'], 
+                       markers=True, title="Score History", render_mode='webgl')
+    # uirevision keeps the user's zoom/legend state when the figure is re-sent on a rerun
+    fig_line.update_layout(DARK_LAYOUT, hovermode="x unified", uirevision='history')
+    return fig_line
+
+def build_sim_chart(current, simulated):
+    go = _go()
+    fig_sim = go.Figure([
+        go.Bar(x=[current], y=['Current'], orientation='h', name='Current', marker_color='gray'),
+        go.Bar(x=[simulated], y=['Simulated'], orientation='h', name='Simulated', marker_color='#00FF99'),
+    ])
+    fig_sim.update_layout(DARK_LAYOUT, height=200, xaxis_title='Score', yaxis_title='Scenario', legend_title_text='Scenario',
+                          uirevision='sim')
+    return fig_sim
+
+# --- SIMULATOR ---
+# A fragment: slider moves rerun only this panel, not the DB reads and tabs around it
+@st.fragment
+def simulator_panel(inputs, g, final):
+    col_sim_input, col_sim_output = st.columns([1, 2])
+
+    with col_sim_input:
+        st.markdown("**Controls**")
+        # Uploaded values can fall outside (or between) the slider grids; start from the nearest grid point
+        defaults = {
+            'energy': max(0, min(int(SIM_ENERGY[-1]), int(round(inputs['energy'], -3)))),
+            'turnover': max(0, min(int(SIM_TURNOVER[-1]), int(inputs['turnover']))),
+            'recycling': max(0, min(int(SIM_RECYCLING[-1]), int(inputs['recycling']))),
+        }
+        sim = {
+            'energy': st.slider("Energy (kWh)", 0, int(SIM_ENERGY[-1]), defaults['energy'], step=SIM_ENERGY_STEP, key="sim_e"),
+            'turnover': st.slider("Turnover (%)", 0, int(SIM_TURNOVER[-1]), defaults['turnover'], key="sim_t"),
+            'recycling': st.slider("Recycling (%)", 0, int(SIM_RECYCLING[-1]), defaults['recycling'], key="sim_r"),
+        }
+
+    with col_sim_output:
+        # A slider left at its default keeps the exact input, so an untouched panel matches "Current"
+        row = pack_inputs(inputs)
+        for k, v in sim.items():
+            if v != defaults[k]:
+                row[SCORE_KEYS.index(k)] = v
+        if all(row[SCORE_KEYS.index(k)] == v for k, v in sim.items()):
+            e_table, s_table = simulator_tables(inputs)
+            s_final = float(e_table[sim['energy'] // SIM_ENERGY_STEP, sim['recycling']] + s_table[sim['turnover']] + g) / 3
+        else:
+            # Off-grid inputs aren't in the tables; score that one row directly
+            s_final = float(score_batch(row.reshape(1, -1))[0, 0])
+
+        st.markdown("#### Projected Impact")
+        c_sim1, c_sim2 = st.columns(2)
+        c_sim1.metric("Current", f"{final:.1f}")
+        c_sim2.metric("Simulated", f"{s_final:.1f}", delta=f"{s_final - final:.1f}")
+
+        st.plotly_chart(build_sim_chart(final, s_final), use_container_width=True, key="sim_chart")
+
 # --- AUTHENTICATION FLOW ---
-credentials = get_credentials()
-authenticator = stauth.Authenticate(credentials, 'green_analytics_cookie', 'secure_key_analytics', cookie_expiry_days=1)
+# Built on every run of each session: it owns that browser's cookie manager component, which must
+# render each run, so it can't be shared across sessions. The user table behind it comes from the
+# cached get_credentials, so reruns (login keystrokes included) still don't query the database
+authenticator = stauth.Authenticate(get_credentials(), 'green_analytics_cookie', 'secure_key_analytics', cookie_expiry_days=1)
 
 if 'authentication_status' not in st.session_state:
     st.session_state['authentication_status'] = None
@@ -275,13 +543,20 @@ if not st.session_state['authentication_status']:
                 new_pass = st.text_input("Password", type="password")
                 if st.form_submit_button("Register"):
                     if len(new_pass) > 3:
-                        if register_user(new_user, new_name, new_pass):
+                        # Hashing blocks this run for a moment; show progress while it does
+                        with st.spinner("Creating account..."):
+                            created = register_user(new_user, new_name, new_pass)
+                        if created:
                             st.success("Account created! Please login.")
                         else:
                             st.error("Username taken.")
                     else:
                         st.warning("Password too short.")
 
+    # Still logged out: stop before the dashboard
+    if not st.session_state['authentication_status']:
+        st.stop()
+
 # --- MAIN DASHBOARD (TEMPLATE MODE) ---
 if st.session_state['authentication_status']:
     st.session_state.initial_sidebar_state = "expanded"
@@ -303,56 +578,96 @@ if st.session_state['authentication_status']:
     if input_method == "Manual Entry":
         with st.sidebar.form("manual_form"):
             st.markdown("### 🌍 Environment")
-            e1 = st.number_input("Energy Consumption (kWh)", 0, 200000, 50000)
-            e2 = st.number_input("Water Usage (m³)", 0, 50000, 2000)
-            e3 = st.slider("Recycling Rate (%)", 0, 100, 40)
-            e4 = st.slider("Renewable Energy (%)", 0, 100, 20)
+            st.number_input("Energy Consumption (kWh)", 0, 200000, 50000, key="in_energy")
+            st.number_input("Water Usage (m³)", 0, 50000, 2000, key="in_water")
+            st.slider("Recycling Rate (%)", 0, 100, 40, key="in_recycling")
+            st.slider("Renewable Energy (%)", 0, 100, 20, key="in_renewable")
             
             st.markdown("### 👥 Social")
-            s1 = st.slider("Employee Turnover (%)", 0, 100, 15)
-            s2 = st.number_input("Safety Incidents", 0, 100, 0)
-            s3 = st.slider("Management Diversity (%)", 0, 100, 30)
+            st.slider("Employee Turnover (%)", 0, 100, 15, key="in_turnover")
+            st.number_input("Safety Incidents", 0, 100, 0, key="in_incidents")
+            st.slider("Management Diversity (%)", 0, 100, 30, key="in_diversity")
             
             st.markdown("### ⚖️ Governance")
-            g1 = st.slider("Board Independence (%)", 0, 100, 60)
-            g2 = st.slider("Ethics Training (%)", 0, 100, 95)
+            st.slider("Board Independence (%)", 0, 100, 60, key="in_board")
+            st.slider("Ethics Training (%)", 0, 100, 95, key="in_ethics")
             
             if st.form_submit_button("🚀 GENERATE REPORT", type="primary"):
-                inputs = {'energy':e1, 'water':e2, 'recycling':e3, 'renewable':e4, 'turnover':s1, 'incidents':s2, 'diversity':s3, 'board':g1, 'ethics':g2}
+                # Widgets are keyed "in_<metric>", so the submitted values come straight from session state
+                inputs = {k: st.session_state[f"in_{k}"] for k in SCORE_KEYS}
                 calc_triggered = True
     else:
         st.sidebar.info("Upload a CSV with columns: metric, value")
         uploaded_file = st.sidebar.file_uploader("Upload Data", type=['csv'])
         if uploaded_file and st.sidebar.button("Process File"):
             try:
-                df = pd.read_csv(uploaded_file)
-                # Basic csv parsing logic (simplified)
-                inputs = df.set_index('metric')['value'].to_dict() if 'metric' in df.columns else df.iloc[0].to_dict()
+                # Arrow parser and Arrow-backed columns: multithreaded parse, strings stay in Arrow buffers
+                df = pd.read_csv(uploaded_file, engine='pyarrow', dtype_backend='pyarrow')
+                if 'metric' in df.columns:
+                    # Map metric names in one vectorized pass; unknown or non-numeric rows are dropped
+                    mapped = df['metric'].astype(str).str.strip().str.lower().map(METRIC_KEYS)
+                    # On Arrow columns a coerced "abc" becomes NaN rather than NA, so test finiteness on a plain float array
+                    values = pd.to_numeric(df['value'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+                    good = mapped.notna().to_numpy() & np.isfinite(values)
+                    # Metrics that are absent or unusable take the defaults, as in the wide path
+                    inputs = dict(zip(SCORE_KEYS, SCORE_DEFAULTS.tolist()))
+                    inputs.update(zip(mapped[good], values[good].tolist()))
+                else:
+                    df.columns = [str(c).strip().lower() for c in df.columns]
+                    # Typed (N, 9) float matrix in kernel order; missing columns and blank or non-finite cells take the defaults
+                    matrix = df.reindex(columns=list(SCORE_KEYS)).astype(float).to_numpy()
+                    matrix = np.where(np.isfinite(matrix), matrix, SCORE_DEFAULTS)
+                    inputs = dict(zip(SCORE_KEYS, matrix[0].tolist()))
+                    # Re-processing the same file shouldn't store any of its rows again
+                    batch_hash = hash((username, matrix.tobytes()))
+                    if len(df) > 1 and st.session_state.get("last_batch_hash") != batch_hash:
+                        # The dashboard shows the first row; score every row in one batch and store them in one transaction
+                        scores = score_batch(matrix)
+                        rows = [(*row_scores, tuple(metrics)) for row_scores, metrics in zip(scores[1:].tolist(), matrix[1:].tolist())]
+                        inputs_hash = hash((username, frozenset(inputs.items())))
+                        first_is_new = st.session_state.get("last_saved_hash") != inputs_hash
+                        if first_is_new:
+                            rows.insert(0, (*scores[0].tolist(), tuple(matrix[0].tolist())))
+                        save_many(username, rows)
+                        st.session_state["last_batch_hash"] = batch_hash
+                        if first_is_new:
+                            st.session_state["last_saved_hash"] = inputs_hash
                 calc_triggered = True
                 st.sidebar.success("File processed!")
             except Exception as e:
                 st.error(f"Error parsing file: {e}")
 
+    if calc_triggered:
+        final, e, s, g = calculate_scores(inputs)
+        # Resubmitting identical inputs shouldn't add another history row
+        inputs_hash = hash((username, frozenset(inputs.items())))
+        if st.session_state.get("last_saved_hash") != inputs_hash:
+            save_data(username, final, e, s, g, inputs)
+            st.session_state["last_saved_hash"] = inputs_hash
+        st.session_state["last_scores"] = (username, final, e, s, g, inputs)
+
+    # Keep showing the last report on reruns that didn't submit anything (tab clicks, widget changes)
+    last_scores = st.session_state.get("last_scores")
+    has_scores = last_scores is not None and last_scores[0] == username
+    if has_scores:
+        _, final, e, s, g, inputs = last_scores
+
     # HEADER AREA
     col_head_1, col_head_2 = st.columns([3, 1])
     with col_head_1:
         st.title("GreenAnalytics Dashboard")
         st.markdown(f"**Date:** {datetime.datetime.now().strftime('%B %d, %Y')}")
     with col_head_2:
-        if calc_triggered and pdf_available:
-            final, e, s, g = calculate_scores(inputs)
-            pdf_bytes = create_pdf(name, final, e, s, g, inputs)
+        if has_scores and pdf_available:
+            pdf_bytes = create_pdf(name, round(final, 1), round(e, 1), round(s, 1), round(g, 1),
+                                   tuple(inputs.items()), datetime.date.today().isoformat())
             st.download_button("📄 Download PDF", pdf_bytes, "Report.pdf", "application/pdf")
 
-    if not calc_triggered:
+    if not has_scores:
          # Empty State / Landing
         st.info("👈 Please enter data in the sidebar to view the analytics template.")
     
     else:
-        # Run Calculation
-        final, e, s, g = calculate_scores(inputs)
-        save_data(username, final, e, s, g, inputs)
-
         # TABS
         tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 RANKING", "🎯 OBJECTIVES", "💰 IMPACT", "🕰️ HISTORY", "🧪 SIMULATOR"])
 
@@ -373,55 +688,13 @@ if st.session_state['authentication_status']:
             
             with col_viz1:
                 st.subheader("Overall Health")
-                # Using a Gauge Chart
-                fig_gauge = go.Figure(go.Indicator(
-                    mode = "gauge+number",
-                    value = final,
-                    domain = {'x': [0, 1], 'y': [0, 1]},
-                    gauge = {
-                        'axis': {'range': [None, 100], 'tickwidth': 1, 'tickcolor': "white"},
-                        'bar': {'color': "#00FF99"},
-                        'bgcolor': "rgba(0,0,0,0)",
-                        'borderwidth': 2,
-                        'bordercolor': "gray",
-                        'steps': [
-                            {'range': [0, 50], 'color': '#FF5252'},
-                            {'range': [50, 75], 'color': '#FFD740'},
-                            {'range': [75, 100], 'color': '#69F0AE'}],
-                        'threshold': {
-                            'line': {'color': "white", 'width': 4},
-                            'thickness': 0.75,
-                            'value': 80}}))
-                fig_gauge.update_layout(paper_bgcolor='rgba(0,0,0,0)', font={'color': "white"}, margin=dict(l=20,r=20,t=50,b=20))
-                st.plotly_chart(fig_gauge, use_container_width=True)
+                st.plotly_chart(build_gauge(final), use_container_width=True, key="gauge_chart")
                 
                 st.info(f"💡 **Insight:** {generate_text_insight(final, 'Overall')}")
 
             with col_viz2:
                 st.subheader("Metric Breakdown")
-                # Horizontal Bar Chart
-                breakdown_data = pd.DataFrame({
-                    'Metric': ['Energy Eff.', 'Water Mgmt', 'Recycling', 'Social Turnover', 'Safety', 'Diversity', 'Board', 'Ethics'],
-                    'Score': [
-                        max(0, 100 - inputs['energy']/1000), 
-                        max(0, 100 - inputs['water']/500), 
-                        inputs['recycling'], 
-                        max(0, 100 - inputs['turnover']*2), 
-                        max(0, 100 - inputs['incidents']*10),
-                        inputs['diversity'],
-                        inputs['board'],
-                        inputs['ethics']
-                    ]
-                })
-                # Cap scores at 100 for visual
-                breakdown_data['Score'] = breakdown_data['Score'].clip(0, 100)
-                
-                fig_bar = px.bar(breakdown_data, x='Score', y='Metric', orientation='h', 
-                                 text='Score', color='Score', 
-                                 color_continuous_scale=['#FF5252', '#FFD740', '#00FF99'])
-                fig_bar.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', 
-                                      font={'color': "white"}, xaxis=dict(showgrid=False), yaxis=dict(showgrid=False))
-                st.plotly_chart(fig_bar, use_container_width=True)
+                st.plotly_chart(build_breakdown(inputs), use_container_width=True, key="breakdown_chart")
 
             with st.expander("📚 Metric Definitions"):
                 st.markdown("""
@@ -486,44 +759,17 @@ if st.session_state['authentication_status']:
             st.subheader("🕰️ Trends")
             hist_df = get_history(username)
             if not hist_df.empty:
-                hist_df['Date'] = pd.to_datetime(hist_df['Date']).dt.strftime('%Y-%m-%d %H:%M')
-                fig_line = px.line(hist_df, x='Date', y=['Overall', 'Environmental', 'Social', 'Governance'], 
-                                   markers=True, title="Score History")
-                fig_line.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', 
-                                       font={'color': "white"}, hovermode="x unified")
-                st.plotly_chart(fig_line, use_container_width=True)
+                if len(hist_df) > HISTORY_MAX_POINTS:
+                    # Downsample on the Overall series; the other pillars follow the same rows
+                    keep = lttb_indices(hist_df['Date'].astype('int64').to_numpy(), hist_df['Overall'].to_numpy(), HISTORY_MAX_POINTS)
+                    hist_df = hist_df.iloc[keep].reset_index(drop=True)
+                local_tz = datetime.datetime.now().astimezone().tzinfo
+                hist_df['Date'] = hist_df['Date'].dt.tz_convert(local_tz).dt.strftime('%Y-%m-%d %H:%M')
+                st.plotly_chart(build_history_chart(hist_df), use_container_width=True, key="history_chart")
             else:
                 st.info("No history available.")
 
         with tab5:
             st.subheader("🧪 Simulator")
             
-            col_sim_input, col_sim_output = st.columns([1, 2])
-            
-            with col_sim_input:
-                st.markdown("**Controls**")
-                sim_energy = st.slider("Energy (kWh)", 0, 100000, int(inputs['energy']), key="sim_e")
-                sim_turnover = st.slider("Turnover (%)", 0, 50, int(inputs['turnover']), key="sim_t")
-                sim_recycling = st.slider("Recycling (%)", 0, 100, int(inputs['recycling']), key="sim_r")
-            
-            with col_sim_output:
-                s_e_raw = ((max(0, 100 - sim_energy/1000)) + (max(0, 100 - inputs['water']/500)) + (sim_recycling) + (inputs['renewable'] * 1.5)) / 4
-                s_e_score = min(100, max(0, s_e_raw))
-                s_s_raw = ((max(0, 100 - sim_turnover*2)) + (max(0, 100 - inputs['incidents']*10)) + (inputs['diversity'])) / 3
-                s_s_score = min(100, max(0, s_s_raw))
-                s_final = (s_e_score + s_s_score + g) / 3
-                
-                st.markdown("#### Projected Impact")
-                c_sim1, c_sim2 = st.columns(2)
-                c_sim1.metric("Current", f"{final:.1f}")
-                c_sim2.metric("Simulated", f"{s_final:.1f}", delta=f"{s_final - final:.1f}")
-                
-                sim_data = pd.DataFrame({
-                    'Scenario': ['Current', 'Simulated'],
-                    'Score': [final, s_final]
-                })
-                fig_sim = px.bar(sim_data, x='Score', y='Scenario', orientation='h', 
-                                 color='Scenario', color_discrete_map={'Current': 'gray', 'Simulated': '#00FF99'})
-                fig_sim.update_layout(height=200, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', 
-                                      font={'color': "white"})
-                st.plotly_chart(fig_sim, use_container_width=True)
+            simulator_panel(inputs, g, final)